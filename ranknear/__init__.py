@@ -1,3 +1,29 @@
-from ranknear.database import Database
-from ranknear.dataset import Dataset
-from ranknear.ranknet import RankNet
+import importlib
+import sys
+
+# submodules are imported on first attribute access to keep `import ranknear` cheap
+_lazy_attributes = {
+    'Database': 'ranknear.database',
+    'Dataset': 'ranknear.dataset',
+    'RankNet': 'ranknear.ranknet',
+    'ScoreIndex': 'ranknear.scoreindex',
+    'VenueStore': 'ranknear.venuestore',
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attributes.keys()))
+
+
+# module level __getattr__ is only supported since Python 3.7 (PEP 562)
+if sys.version_info < (3, 7):
+    for _name in _lazy_attributes:
+        __getattr__(_name)
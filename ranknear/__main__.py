@@ -1,33 +1,80 @@
 import ranknear
 
 
-def main():
-    # set up argument parser
-    import argparse
-    parser = argparse.ArgumentParser(description='RankNear - Rank the locations nearby using RankNet.')
-    parser.add_argument('-s', '--sqlite',
-                        action='store', dest='sqlite', type=str,
-                        help='The SQLite3 database to read from.', required=True)
-    parser.add_argument('-t', '--train',
-                        action='store', dest='train', type=str,
-                        help='The training matrix file to read from.', required=False)
-    parser.add_argument('-o', '--out',
-                        action='store', dest='model', type=str,
-                        help='The model file to output.', default='./model.h5', required=False)
-    results = parser.parse_args()
+def open_database(results):
+    store = None
+    if results.store:
+        from ranknear.venuestore import VenueStore
+        store = VenueStore(results.sqlite)
+    return ranknear.Database(results.sqlite, store=store)
+
 
+def train(results):
     # train the model
-    database = ranknear.Database(results.sqlite)
     dataset = ranknear.Dataset()
     if results.train:
         dataset.load(results.train)
     else:
-        dataset.prepare(database)
+        dataset.prepare(open_database(results))
 
     ranknet = ranknear.RankNet()
     ranknet.train(dataset.get_features(), dataset.get_labels())
     ranknet.save(results.model)
 
 
+def score(results):
+    import numpy as np
+    from ranknear.ranknet import model_identity
+    # score every venue in bulk and store the results back to the database
+    database = open_database(results)
+    dataset = ranknear.Dataset()
+    ranknet = ranknear.RankNet()
+    ranknet.load(results.model)
+
+    if results.train:
+        dataset.load(results.train)
+        ids, features = dataset.vectorize_database(database)
+    else:
+        # prepare already vectorizes every venue, reuse its features
+        dataset.prepare(database)
+        ids, features = dataset.get_ids(), dataset.get_features()
+
+    scores = ranknet.rank(np.asarray(features)).ravel()
+    database.store_scores(ids, features, scores, model_identity(results.model))
+
+
+def main():
+    # set up argument parser
+    import argparse
+    parser = argparse.ArgumentParser(description='RankNear - Rank the locations nearby using RankNet.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    train_parser = subparsers.add_parser('train', help='Train the model from the database.')
+    train_parser.set_defaults(func=train)
+    train_parser.add_argument('-o', '--out',
+                              action='store', dest='model', type=str,
+                              help='The model file to output.', default='./model.h5', required=False)
+
+    score_parser = subparsers.add_parser('score', help='Score every venue and store the scores to the database.')
+    score_parser.set_defaults(func=score)
+    score_parser.add_argument('-m', '--model',
+                              action='store', dest='model', type=str,
+                              help='The trained model to read from.', required=True)
+
+    for subparser in (train_parser, score_parser):
+        subparser.add_argument('-s', '--sqlite',
+                               action='store', dest='sqlite', type=str,
+                               help='The SQLite3 database to read from.', required=True)
+        subparser.add_argument('-t', '--train',
+                               action='store', dest='train', type=str,
+                               help='The training matrix file to read from.', required=False)
+        subparser.add_argument('--store',
+                               action='store_true', dest='store',
+                               help='Vectorize the venues from a memory-resident columnar store.', required=False)
+    results = parser.parse_args()
+    results.func(results)
+
+
 if __name__ == '__main__':
     main()
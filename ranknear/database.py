@@ -1,17 +1,30 @@
 import pygeohash as geohash
 import sqlite3
+import json
+import math
 from haversine import haversine
+from ranknear.scoreindex import ScoreIndex
 
 
 class Database(object):
-    def __init__(self, database):
+    def __init__(self, database, store=None):
         self._file_path = database
         self._conn = sqlite3.connect(database)
         self._total_num = 0
         self._categories = {}
+        self._score_index = None
+        self._score_version = None
+        # optional VenueStore serving the venue reads from memory
+        self._store = store
         self._get_globals()
 
     def _get_globals(self):
+        if self._store is not None:
+            self._total_num = len(self._store)
+            for name, num in zip(self._store.get_category_names(), self._store.get_category_counts().tolist()):
+                self._categories[name] = int(num)
+            return
+
         self._total_num = int(self._conn.execute('''SELECT COUNT(*) FROM \'Beijing-Checkins\' ''').fetchone()[0])
         for row in self._conn.execute('''SELECT category, COUNT(*) AS num FROM "Beijing-Checkins" GROUP BY category'''):
             self._categories[str(row[0])] = int(row[1])
@@ -25,6 +38,9 @@ class Database(object):
         return self._categories
 
     def get_neighboring_points(self, lng, lat, r, geo=None):
+        if self._store is not None:
+            return [self._store.to_point(index) for index in self._store.get_neighbors(lng, lat, r, geo=geo)]
+
         geo_hash = geo[:6] if geo is not None else geohash.encode(float(lat), float(lng), 6)
         neighbors = []
         potential_neighbors = []
@@ -46,6 +62,13 @@ class Database(object):
         return neighbors
 
     def expand_info(self, point):
+        if self._store is not None:
+            index = self._store.get_index(point['id'])
+            point.update(self._store.to_point(index))
+            point['name'] = self._store.get_name(index)
+            point['address'] = self._store.get_address(index)
+            return point
+
         row = self._conn.execute('''SELECT lng,lat,name,address,category,checkins 
                                       FROM \'Beijing-Checkins\' WHERE id=? LIMIT 1''',
                                  (point['id'],)).fetchone()
@@ -57,6 +80,33 @@ class Database(object):
         point['checkins'] = int(row[5])
         return point
 
+    def expand_infos(self, points):
+        """ Batched expand_info, reads the info of all the points with a single query. """
+        if self._store is not None:
+            for point in points:
+                self.expand_info(point)
+            return points
+
+        rows = {}
+        ids = [int(point['id']) for point in points]
+        # stay below sqlite's default limit of host parameters
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            for row in self._conn.execute('''SELECT id,lng,lat,name,address,category,checkins
+                                               FROM \'Beijing-Checkins\' WHERE id IN (%s)'''
+                                          % ','.join('?' * len(part)), part):
+                rows[int(row[0])] = row
+
+        for point in points:
+            row = rows[int(point['id'])]
+            point['lng'] = float(row[1])
+            point['lat'] = float(row[2])
+            point['name'] = str(row[3])
+            point['address'] = str(row[4])
+            point['category'] = str(row[5])
+            point['checkins'] = int(row[6])
+        return points
+
     def update_geohash(self):
         c = self._conn.cursor()
         # if geohash has never been calculated
@@ -68,6 +118,16 @@ class Database(object):
             self._conn.commit()
 
     def expand_neighbors(self, point):
+        if self._store is not None:
+            indices = self._store.index_of([neighbor['id'] for neighbor in point['neighbors']])
+            if (indices == -1).any():
+                raise KeyError([neighbor['id'] for neighbor, index in zip(point['neighbors'], indices.tolist())
+                                if index == -1])
+            for neighbor, index in zip(point['neighbors'], indices.tolist()):
+                neighbor['checkins'] = int(self._store.checkins[index])
+                neighbor['category'] = self._store.get_category_name(self._store.categories[index])
+            return point
+
         for neighbor in point['neighbors']:
             row = self._conn.execute('''SELECT checkins,category FROM \'Beijing-Checkins\' WHERE id=? LIMIT 1''',
                                      (neighbor['id'],)).fetchone()
@@ -81,6 +141,150 @@ class Database(object):
             del neighbor['checkins']
             del neighbor['category']
 
+    def store_scores(self, ids, features, scores, model=None):
+        """ Store the pre-computed features and scores of the venues into 'Beijing-Scores'.
+
+        model identifies the model that produced the scores, see ranknet.model_identity.
+        """
+        # build the new table aside and swap it in within one explicit transaction, so readers never miss
+        # the table, the connection is switched to autocommit mode as older sqlite3 commits before DDL
+        self._conn.commit()
+        isolation_level = self._conn.isolation_level
+        self._conn.isolation_level = None
+        try:
+            self._conn.execute('''BEGIN''')
+            try:
+                self._conn.execute('''DROP TABLE IF EXISTS \'Beijing-Scores-New\'''')
+                self._conn.execute('''CREATE TABLE \'Beijing-Scores-New\' (
+                                        id INTEGER PRIMARY KEY, lat REAL, lng REAL, features TEXT, score REAL)''')
+                self._conn.executemany('''INSERT INTO \'Beijing-Scores-New\' (id, lat, lng, features, score)
+                                            SELECT id, lat, lng, ?, ? FROM \'Beijing-Checkins\' WHERE id=?''',
+                                       ((json.dumps([float(value) for value in feature]), float(score), int(venue_id))
+                                        for venue_id, feature, score in zip(ids, features, scores)))
+                self._conn.execute('''DROP TABLE IF EXISTS \'Beijing-Scores\'''')
+                self._conn.execute('''ALTER TABLE \'Beijing-Scores-New\' RENAME TO \'Beijing-Scores\'''')
+                self._conn.execute('''CREATE INDEX \'Beijing-Scores-Location\' ON \'Beijing-Scores\' (lat, lng)''')
+                self._conn.execute('''CREATE TABLE IF NOT EXISTS \'Beijing-Scores-Meta\' (
+                                        key TEXT PRIMARY KEY, value TEXT)''')
+                self._conn.execute('''INSERT OR REPLACE INTO \'Beijing-Scores-Meta\' VALUES (\'model\', ?)''',
+                                   (model, ))
+                self._conn.execute('''COMMIT''')
+            except Exception:
+                self._conn.execute('''ROLLBACK''')
+                raise
+        finally:
+            self._conn.isolation_level = isolation_level
+        self._score_index = None
+
+    def has_scores(self):
+        return self._conn.execute('''SELECT COUNT(*) FROM sqlite_master
+                                       WHERE type=\'table\' AND name=\'Beijing-Scores\'''').fetchone()[0] > 0
+
+    def get_scores_model(self):
+        """ Identity of the model that produced the stored scores, None if unknown or nothing is stored. """
+        if self._conn.execute('''SELECT COUNT(*) FROM sqlite_master
+                                  WHERE type=\'table\' AND name=\'Beijing-Scores-Meta\'''').fetchone()[0] == 0:
+            return None
+        row = self._conn.execute('''SELECT value FROM \'Beijing-Scores-Meta\' WHERE key=\'model\'''').fetchone()
+        return None if row is None else row[0]
+
+    def get_scores(self, ids):
+        """ Look up the pre-computed scores of the venues, ids without a stored score are omitted. """
+        points = {}
+        ids = [int(venue_id) for venue_id in ids]
+        # stay below sqlite's default limit of host parameters
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            for row in self._conn.execute('''SELECT id, lng, lat, score FROM \'Beijing-Scores\' WHERE id IN (%s)'''
+                                          % ','.join('?' * len(part)), part):
+                points[int(row[0])] = {
+                    'id': int(row[0]),
+                    'lng': float(row[1]),
+                    'lat': float(row[2]),
+                    'score': float(row[3])
+                }
+        return points
+
+    def load_score_index(self):
+        """ Build the top-k index from 'Beijing-Scores' unless it is up to date, returns whether it was rebuilt.
+
+        A separate connection is used so the index can be built off the serving thread, the schema version
+        detects the table swap made by store_scores from any process.
+        """
+        conn = sqlite3.connect(self._file_path, isolation_level=None)
+        try:
+            # read the version and the table from the same snapshot
+            conn.execute('''BEGIN''')
+            version = int(conn.execute('''PRAGMA schema_version''').fetchone()[0])
+            if self._score_index is not None and version == self._score_version:
+                return False
+            points = []
+            if conn.execute('''SELECT COUNT(*) FROM sqlite_master
+                               WHERE type=\'table\' AND name=\'Beijing-Scores\'''').fetchone()[0] > 0:
+                points = [(row[0], row[1], float(row[2]), float(row[3]))
+                          for row in conn.execute('''SELECT score, id, lng, lat FROM \'Beijing-Scores\'''')]
+        finally:
+            conn.close()
+
+        self._score_index, self._score_version = ScoreIndex(points), version
+        return True
+
+    def is_score_index_ready(self):
+        return self._score_index is not None
+
+    def _get_score_index(self):
+        if self._score_index is None:
+            self.load_score_index()
+        return self._score_index
+
+    def get_top_points(self, k, min_lng, min_lat, max_lng, max_lat):
+        """ Retrieve the k highest-scoring venues inside the bounding box, ordered by score descending. """
+        top = self._get_score_index().top(int(k), float(min_lng), float(min_lat), float(max_lng), float(max_lat))
+        return [{'id': venue_id, 'lng': lng, 'lat': lat, 'score': score} for score, venue_id, lng, lat in top]
+
+    def get_top_neighboring_points(self, k, lng, lat, r):
+        """ Retrieve the k highest-scoring venues within r meters, ordered by score descending. """
+        lng, lat = float(lng), float(lat)
+        # bounding box of the circle, one degree of latitude is roughly 111km
+        d_lat = r / 111000.0
+        d_lng = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        top = self._get_score_index().top(int(k), lng - d_lng, lat - d_lat, lng + d_lng, lat + d_lat,
+                                          lambda point: haversine((point[3], point[2]), (lat, lng)) * 1000 <= r)
+        return [{'id': venue_id, 'lng': p_lng, 'lat': p_lat, 'score': score} for score, venue_id, p_lng, p_lat in top]
+
+    def get_hot_points(self, category, limit):
+        """ Retrieve the venues of the category with the most checkins. """
+        if self._store is not None:
+            import numpy as np
+            store = self._store
+            indices = np.flatnonzero((store.categories == store.get_category_code(category)) & (store.checkins > 0))
+            indices = indices[np.argsort(-store.checkins[indices], kind='stable')[:limit]]
+            return [{
+                'id': int(store.ids[index]),
+                'lng': float(store.lngs[index]),
+                'lat': float(store.lats[index]),
+                'name': store.get_name(index),
+                'address': store.get_address(index),
+                'checkins': int(store.checkins[index])
+            } for index in indices.tolist()]
+
+        result = []
+        for row in self._conn.execute('''SELECT lng, lat, name, address, checkins, id FROM \'Beijing-Checkins\'
+                                           WHERE category=? AND checkins > 0 ORDER BY checkins DESC LIMIT ?''',
+                                      (category, int(limit))):
+            result.append({
+                'id': int(row[5]),
+                'lng': float(row[0]),
+                'lat': float(row[1]),
+                'name': str(row[2]),
+                'address': str(row[3]),
+                'checkins': int(row[4])
+            })
+        return result
+
+    def get_store(self):
+        return self._store
+
     def get_connection(self):
         return self._conn
 
@@ -2,6 +2,7 @@ import time
 import json
 import math
 import logging
+import weakref
 from ranknear.database import Database
 
 
@@ -11,6 +12,7 @@ logger = logging.getLogger(__name__)
 class Dataset(object):
     def __init__(self):
         # training related variables
+        self._ids = []
         self._labels = []
         self._features = []
 
@@ -21,6 +23,9 @@ class Dataset(object):
         self._database = None
         self.is_ready = False
 
+        # per store and training category jensen quality weights for vectorize_indices
+        self._jensen_weights = weakref.WeakKeyDictionary()
+
     def vectorize_point(self, neighbors, training_category):
         neighbor_categories = self._neighbor_categories(neighbors)
 
@@ -64,9 +69,65 @@ class Dataset(object):
         x.append(popularity)
         return x
 
+    def _get_jensen_weights(self, store, training_category):
+        weights = self._jensen_weights.setdefault(store, {})
+        if training_category not in weights:
+            import numpy as np
+            names = store.get_category_names()
+            log_coefficients = np.zeros(len(names))
+            means = np.zeros(len(names))
+            # categories missing from the store always have zero neighbors
+            offset = 0
+            for category, _ in self._categories.items():
+                coefficient = self._category_coefficient[category][training_category]
+                if coefficient == 0:
+                    continue
+                code = store.get_category_code(category)
+                if code == -1:
+                    offset -= math.log(coefficient) * self._mean_category_number[category][training_category]
+                else:
+                    log_coefficients[code] = math.log(coefficient)
+                    means[code] = self._mean_category_number[category][training_category]
+            weights[training_category] = (log_coefficients, means, offset)
+        return weights[training_category]
+
+    def _vectorize_counts(self, store, counts, checkins, training_category):
+        import numpy as np
+        num = counts.sum(axis=1)
+        features = np.zeros((len(counts), 5))
+
+        # density
+        features[:, 0] = num
+
+        # neighbors entropy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = counts / num[:, np.newaxis].astype(float)
+            features[:, 1] = -np.where(counts != 0, p * np.log(np.where(counts != 0, p, 1)), 0).sum(axis=1)
+
+            # competitiveness
+            code = store.get_category_code(training_category)
+            if code != -1:
+                features[:, 2] = np.where(num != 0, -1 * counts[:, code] / num.astype(float), 0)
+
+        # quality by jensen
+        log_coefficients, means, offset = self._get_jensen_weights(store, training_category)
+        features[:, 3] = (counts - means).dot(log_coefficients) + offset
+
+        # area popularity
+        features[:, 4] = checkins
+        return [[int(x[0]), float(x[1]), float(x[2]), float(x[3]), int(x[4])] for x in features.tolist()]
+
+    def vectorize_indices(self, store, indices, training_category):
+        """ Vectorized vectorize_point for neighbors given as VenueStore row indices. """
+        import numpy as np
+        counts = np.bincount(store.categories[indices], minlength=len(store.get_category_names()))
+        return self._vectorize_counts(store, counts[np.newaxis, :], np.array([store.checkins[indices].sum()]),
+                                      training_category)[0]
+
     def load(self, path):
         logger.info('Pre-calculated train file found, loading from external file...')
         start_time = time.time()
+        self._jensen_weights.clear()
 
         with open(path, 'r') as f:
             self._mean_category_number = json.loads(f.readline())
@@ -75,6 +136,7 @@ class Dataset(object):
             self._labels = json.loads(f.readline())
             self._features = json.loads(f.readline())
 
+        self.is_ready = True
         end_time = time.time()
         logger.info('Training data read in %f seconds.' % (end_time - start_time))
 
@@ -87,6 +149,10 @@ class Dataset(object):
             f.write(json.dumps(self._features))
         logger.info('Calculated training data stored into %s.' % path)
 
+    def get_ids(self):
+        """ Venue ids of the features, only available after prepare. """
+        return self._ids
+
     def get_features(self):
         return self._features
 
@@ -172,20 +238,20 @@ class Dataset(object):
         # create and start processes
         process_count = mp.cpu_count()
         parts = self._split_range(total_num, int(math.ceil(float(total_num) / process_count)))
-        for i in range(process_count):
+        for i in range(len(parts)):
             process = mp.Process(target=calculate_local_parameters, args=(
                 self._database.get_file_path(), parts[i], self._neighbor_categories,
                 self._categories, result_queue, progress_queue))
             process.start()
 
-        logger.info('Starting {} processes.'.format(process_count))
+        logger.info('Starting {} processes.'.format(len(parts)))
 
         self._display_progress('Calculating global parameters', total_num, progress_queue)
 
         logger.info('Processes finished.')
 
         # retrieve and merge the results
-        for _ in range(process_count):
+        for _ in range(len(parts)):
             mean_category_number, k_suffixes = result_queue.get()
             for p, _ in self._categories.items():
                 for l, _ in self._categories.items():
@@ -194,6 +260,29 @@ class Dataset(object):
                     # TODO: to delete this line of code when we run training in full dataset
                     self._category_coefficient[p][l] += k_suffixes[p][l]
 
+        self._normalize_global_parameters(total_num)
+
+    def _calculate_store_parameters(self, store):
+        import numpy as np
+        names = store.get_category_names()
+        # neighbor category counts per venue category, transposed mean category number
+        by_category = np.zeros((len(names), len(names)))
+        k_suffixes = np.zeros((len(names), len(names)))
+        for rows, counts, _ in store.iter_neighbor_counts(200):
+            categories = store.categories[rows]
+            np.add.at(by_category, categories, counts)
+            sub = counts.sum(axis=1) - counts[np.arange(len(rows)), categories]
+            valid = sub != 0
+            np.add.at(k_suffixes, categories[valid], counts[valid] / sub[valid, np.newaxis].astype(float))
+
+        for a, p in enumerate(names):
+            for b, l in enumerate(names):
+                self._mean_category_number[p][l] += float(by_category[b, a])
+                self._category_coefficient[p][l] += float(k_suffixes[a, b])
+
+        self._normalize_global_parameters(len(store))
+
+    def _normalize_global_parameters(self, total_num):
         # subsequent calculations
         for p, _ in self._categories.items():
             for l, _ in self._categories.items():
@@ -204,7 +293,7 @@ class Dataset(object):
                 k_prefix = float(total_num - self._categories[p]) / (self._categories[p] * self._categories[l])
                 self._category_coefficient[p][l] *= k_prefix
 
-    def _calculate_features(self):
+    def _vectorize_database(self, database):
         import multiprocessing as mp
 
         # initialize the queues
@@ -215,17 +304,18 @@ class Dataset(object):
         r = 200
 
         # calculate global parameters
-        total_num = self._database.get_total_num()
+        total_num = database.get_total_num()
 
         def calculate_features(db_path, part, vectorize_point, result_queue, progress_queue):
             # initialize local matrix
+            ids = []
             labels = []
             features = []
 
             database = Database(db_path)
             # calculate mean category numbers
             for row in database.get_connection().execute(
-                            '''SELECT lng,lat,geohash,checkins FROM \'Beijing-Checkins\' LIMIT %d,%d''' % (
+                            '''SELECT lng,lat,geohash,checkins,id FROM \'Beijing-Checkins\' LIMIT %d,%d''' % (
                             part[0], part[1])):
                 try:
                     neighbors = database.get_neighboring_points(float(row[0]), float(row[1]), r, geo=str(row[2]))
@@ -233,39 +323,83 @@ class Dataset(object):
                     features.append(vectorize_point(neighbors, '生活娱乐'))
                     # add label
                     labels.append([int(row[3])])
+                    ids.append(int(row[4]))
                 except Exception as e:
                     print(e)
                 finally:
                     progress_queue.put(1)
 
-            result_queue.put((labels, features))
+            result_queue.put((ids, labels, features))
             return
 
         process_count = mp.cpu_count()
         parts = self._split_range(total_num, int(math.ceil(float(total_num) / process_count)))
-        for i in range(process_count):
+        for i in range(len(parts)):
             process = mp.Process(target=calculate_features, args=(
-                self._database.get_file_path(), parts[i], self.vectorize_point, result_queue, progress_queue))
+                database.get_file_path(), parts[i], self.vectorize_point, result_queue, progress_queue))
             process.start()
 
-        logger.info('Starting {} processes.'.format(process_count))
+        logger.info('Starting {} processes.'.format(len(parts)))
 
         self._display_progress('Calculating features', total_num, progress_queue)
 
         logger.info('Processes finished.')
 
         # retrieve results
-        for _ in range(process_count):
-            labels, features = result_queue.get()
-            self._labels.extend(labels)
-            self._features.extend(features)
+        all_ids, all_labels, all_features = [], [], []
+        for _ in range(len(parts)):
+            ids, labels, features = result_queue.get()
+            all_ids.extend(ids)
+            all_labels.extend(labels)
+            all_features.extend(features)
+
+        return all_ids, all_labels, all_features
+
+    def _vectorize_store(self, store):
+        ids, labels, features = [], [], []
+        for rows, counts, checkins in store.iter_neighbor_counts(200):
+            ids.extend(store.ids[rows].tolist())
+            labels.extend([checkin] for checkin in store.checkins[rows].tolist())
+            features.extend(self._vectorize_counts(store, counts, checkins, '生活娱乐'))
+        return ids, labels, features
+
+    def _calculate_features(self):
+        store = self._database.get_store()
+        if store is not None:
+            ids, labels, features = self._vectorize_store(store)
+        else:
+            ids, labels, features = self._vectorize_database(self._database)
+        self._ids.extend(ids)
+        self._labels.extend(labels)
+        self._features.extend(features)
+
+    def vectorize_database(self, database):
+        """ Calculate the features of every venue stored in the database.
+
+        The global category parameters must have been prepared or loaded beforehand.
+        Returns a tuple of (ids, features) in matching order.
+        """
+        if not self.is_ready:
+            raise ValueError('Global parameters are not ready, call prepare or load first.')
+        store = database.get_store()
+        if store is not None:
+            ids, _, features = self._vectorize_store(store)
+            return ids, features
+
+        database.update_geohash()
+        ids, _, features = self._vectorize_database(database)
+        return ids, features
 
     def prepare(self, database):
+        """ Calculate the training data from a database path or a Database, which may be backed by a VenueStore. """
         logger.info('Pre-calculated train file not found, calculating training data...')
         start_time = time.time()
-        self._database = Database(database)
+        self._jensen_weights.clear()
+        self._database = database if isinstance(database, Database) else Database(database)
+        store = self._database.get_store()
 
-        self._database.update_geohash()
+        if store is None:
+            self._database.update_geohash()
         self._categories = self._database.get_categories()
 
         # calculate and store the neighboring points
@@ -290,8 +424,12 @@ class Dataset(object):
                 self._category_coefficient[outer][inner] = 0
 
         # calculate global category parameters
-        self._calculate_global_parameters()
+        if store is not None:
+            self._calculate_store_parameters(store)
+        else:
+            self._calculate_global_parameters()
         self._calculate_features()
+        self.is_ready = True
 
         end_time = time.time()
         logger.info('Training data calculated in {} seconds.'.format(end_time - start_time))
@@ -1,10 +1,20 @@
 import numpy as np
 import time
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def model_identity(path):
+    """ Identify a saved model by the SHA-1 of its file, used to tell which model produced stored scores. """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
 class RankNet:
     def __init__(self):
         # training data
@@ -75,12 +85,20 @@ class RankNet:
         self._score_function = backend.function([rel_doc], [rel_score])
 
     def load(self, path):
+        from tensorflow.python.keras import backend
+        from tensorflow.python.keras.layers import Add
         from tensorflow.python.keras.models import load_model
         logger.info('Trained model file found, loading model...')
         self._model = load_model(path)
+        # the first input of the subtraction layer is the relevant document score
+        add = [layer for layer in self._model.layers if isinstance(layer, Add)][0]
+        self._score_function = backend.function([self._model.inputs[0]], [add.input[0]])
         self._is_ready = True
         logger.info('Trained model loaded.')
 
+    def is_ready(self):
+        return self._is_ready
+
     def save(self, path):
         logger.info('Saving model ...')
         self._model.save(path)
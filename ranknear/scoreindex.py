@@ -0,0 +1,75 @@
+import heapq
+import math
+
+
+class ScoreIndex(object):
+    """ Uniform lng/lat grid whose cells hold the venues presorted by score.
+
+    The best score of a cell bounds every venue inside it, so top-k searches visit the cells
+    in descending bound order and stop as soon as no unvisited cell can beat the k-th result.
+    """
+    def __init__(self, points, cell_size=0.01):
+        self._cell_size = cell_size
+        self._cells = {}
+        for score, venue_id, lng, lat in points:
+            self._cells.setdefault(self._cell_of(lng, lat), []).append((float(score), int(venue_id), lng, lat))
+
+        for cell in self._cells.values():
+            cell.sort(reverse=True)
+
+        # all cells ordered by their bound, used when the viewport covers most of the grid
+        self._sorted_cells = sorted(self._cells.keys(), key=lambda key: self._cells[key][0][0], reverse=True)
+
+    def _cell_of(self, lng, lat):
+        return int(math.floor(lng / self._cell_size)), int(math.floor(lat / self._cell_size))
+
+    def _candidate_cells(self, min_lng, min_lat, max_lng, max_lat):
+        min_x, min_y = self._cell_of(min_lng, min_lat)
+        max_x, max_y = self._cell_of(max_lng, max_lat)
+
+        # the viewport covers more cells than there are occupied ones, walk the presorted cells instead
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self._cells):
+            for key in self._sorted_cells:
+                if min_x <= key[0] <= max_x and min_y <= key[1] <= max_y:
+                    yield key
+            return
+
+        heap = []
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                if (x, y) in self._cells:
+                    heap.append((-self._cells[(x, y)][0][0], (x, y)))
+        heapq.heapify(heap)
+        while len(heap) != 0:
+            yield heapq.heappop(heap)[1]
+
+    def top(self, k, min_lng, min_lat, max_lng, max_lat, predicate=None):
+        """ Return the k highest-scoring (score, id, lng, lat) tuples inside the bounding box.
+
+        predicate optionally filters the venues further, e.g. to a radius inside the box.
+        """
+        if k <= 0:
+            return []
+
+        result = []
+        for key in self._candidate_cells(min_lng, min_lat, max_lng, max_lat):
+            cell = self._cells[key]
+            # no venue in this or any later cell can enter the result
+            if len(result) == k and cell[0][0] <= result[0][0]:
+                break
+
+            for point in cell:
+                if len(result) == k and point[0] <= result[0][0]:
+                    break
+                _, _, lng, lat = point
+                if not (min_lng <= lng <= max_lng and min_lat <= lat <= max_lat):
+                    continue
+                if predicate is not None and not predicate(point):
+                    continue
+                if len(result) == k:
+                    heapq.heapreplace(result, point)
+                else:
+                    heapq.heappush(result, point)
+
+        result.sort(reverse=True)
+        return result
@@ -0,0 +1,156 @@
+import sqlite3
+import numpy as np
+import pygeohash as geohash
+
+# mean earth radius in meters, the same one haversine uses
+EARTH_RADIUS = 6371008.8
+
+
+class VenueStore(object):
+    """ Columnar, memory-resident copy of 'Beijing-Checkins'.
+
+    Venues are addressed by their row index: ids, coordinates and checkins live in NumPy arrays,
+    categories are interned into integer codes, and names / addresses are only read into a
+    string pool on first access.
+    """
+    def __init__(self, database):
+        self._file_path = database
+        conn = sqlite3.connect(database)
+        rows = conn.execute('''SELECT id,lat,lng,checkins,category,geohash FROM \'Beijing-Checkins\' ORDER BY id''')
+        ids, lats, lngs, checkins, categories, geohashes = [], [], [], [], [], []
+        self._category_codes = {}
+        self._category_names = []
+        for row in rows:
+            category = str(row[4])
+            if category not in self._category_codes:
+                self._category_codes[category] = len(self._category_names)
+                self._category_names.append(category)
+            ids.append(int(row[0]))
+            lats.append(float(row[1]))
+            lngs.append(float(row[2]))
+            checkins.append(int(row[3]))
+            categories.append(self._category_codes[category])
+            geohashes.append(row[5] if row[5] is not None else geohash.encode(float(row[1]), float(row[2])))
+        conn.close()
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lngs = np.array(lngs, dtype=np.float64)
+        self.checkins = np.array(checkins, dtype=np.int64)
+        self.categories = np.array(categories, dtype=np.int32)
+
+        # geohashes sorted for prefix range searches
+        self.geohashes = np.array(geohashes, dtype=np.bytes_)
+        self._geohash_order = np.argsort(self.geohashes, kind='stable')
+        self._sorted_geohashes = self.geohashes[self._geohash_order]
+
+        # lazily read name / address pool
+        self._text_pool = None
+        self._text_offsets = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_category_names(self):
+        return list(self._category_names)
+
+    def get_category_code(self, category):
+        return self._category_codes.get(category, -1)
+
+    def get_category_name(self, code):
+        return self._category_names[code]
+
+    def get_category_counts(self):
+        return np.bincount(self.categories, minlength=len(self._category_names))
+
+    def index_of(self, ids):
+        """ Map venue ids to row indices, unknown ids are mapped to -1. """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        indices = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where(self.ids[indices] == ids, indices, -1)
+
+    def get_index(self, venue_id):
+        """ Row index of a single venue id, raises KeyError for unknown ids. """
+        index = int(self.index_of([venue_id])[0])
+        if index == -1:
+            raise KeyError(venue_id)
+        return index
+
+    def get_neighbors(self, lng, lat, r, geo=None):
+        """ Return the row indices of the venues within r meters sharing the 6-character geohash. """
+        if isinstance(geo, bytes):
+            geo = geo.decode()
+        prefix = (geo[:6] if geo is not None else geohash.encode(float(lat), float(lng), 6)).encode()
+        start = np.searchsorted(self._sorted_geohashes, prefix, side='left')
+        end = np.searchsorted(self._sorted_geohashes, prefix + b'~', side='left')
+        candidates = np.sort(self._geohash_order[start:end])
+        distances = self.distances(candidates, float(lng), float(lat))
+        return candidates[distances <= r]
+
+    def iter_neighbor_counts(self, r, block=1024):
+        """ Batched get_neighbors for every venue, yields (indices, counts, checkins) blocks.
+
+        counts holds the neighbor category counts of each venue in the block and checkins the sum of
+        their checkins. Venues sharing a 6-character geohash are each other's only candidates, so the
+        distances are computed once per geohash group instead of once per venue.
+        """
+        prefixes = self._sorted_geohashes.astype('S6')
+        boundaries = np.flatnonzero(prefixes[1:] != prefixes[:-1]) + 1
+        for group in np.split(self._geohash_order, boundaries):
+            if len(group) == 0:
+                continue
+            group = np.sort(group)
+            one_hot = np.zeros((len(group), len(self._category_names)), dtype=np.int64)
+            one_hot[np.arange(len(group)), self.categories[group]] = 1
+            for start in range(0, len(group), block):
+                rows = group[start:start + block]
+                within = self.distances(group[np.newaxis, :], self.lngs[rows][:, np.newaxis],
+                                        self.lats[rows][:, np.newaxis]) <= r
+                yield rows, within.dot(one_hot), within.dot(self.checkins[group])
+
+    def distances(self, indices, lng, lat):
+        """ Vectorized haversine distances in meters from (lng, lat) to the given venues.
+
+        lng and lat may also be arrays broadcasting against indices.
+        """
+        lat1, lng1 = np.radians(lat), np.radians(lng)
+        lat2, lng2 = np.radians(self.lats[indices]), np.radians(self.lngs[indices])
+        d = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) * 0.5) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(d))
+
+    def _load_text_pool(self):
+        names, addresses = [], []
+        conn = sqlite3.connect(self._file_path)
+        for row in conn.execute('''SELECT name,address FROM \'Beijing-Checkins\' ORDER BY id'''):
+            names.append(str(row[0]))
+            addresses.append(str(row[1]))
+        conn.close()
+
+        # names followed by addresses in row order, sliced by offsets
+        texts = names + addresses
+        self._text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=self._text_offsets[1:])
+        self._text_pool = ''.join(texts)
+
+    def _get_text(self, i):
+        if self._text_pool is None:
+            self._load_text_pool()
+        return self._text_pool[self._text_offsets[i]:self._text_offsets[i + 1]]
+
+    def get_name(self, index):
+        return self._get_text(int(index))
+
+    def get_address(self, index):
+        return self._get_text(len(self.ids) + int(index))
+
+    def to_point(self, index):
+        """ Build the neighbor dict used by the rest of the code for the venue at the given row. """
+        return {
+            'id': int(self.ids[index]),
+            'lat': float(self.lats[index]),
+            'lng': float(self.lngs[index]),
+            'category': self._category_names[self.categories[index]],
+            'checkins': int(self.checkins[index])
+        }
@@ -1,12 +1,32 @@
 import tornado.ioloop
 import tornado.web
 import json
-from ranknear.ranknet import RankNet
+import logging
+import threading
+import numpy as np
+from ranknear.ranknet import RankNet, model_identity
 from ranknear.database import Database
+from ranknear.dataset import Dataset
+
+logger = logging.getLogger(__name__)
 
 # global ranknet object
 ranknet = RankNet()
+dataset = Dataset()
 connection = None
+# whether a training file was given to enable live scoring, and the error raised while loading
+live_scoring = False
+load_error = None
+# identity of the served model, stored scores of other models are not used
+model = None
+model_mismatch_warned = False
+
+# how far in degrees a query point may be from a stored venue to reuse its score
+COORDINATE_TOLERANCE = 1e-6
+# upper bound of k for /top
+MAX_TOP_K = 1000
+# interval in milliseconds to check whether the scores were rewritten
+SCORE_INDEX_REFRESH_INTERVAL = 10000
 
 
 class WhatsNearHandler(tornado.web.RequestHandler):
@@ -15,28 +35,72 @@ class WhatsNearHandler(tornado.web.RequestHandler):
         self.write('Usage: <br />' +
                    '/query - [[lng, lat], [lng, lat] ...] <br />' +
                    '/hot <br />' +
-                   '/neighbor [lng, lat]')
+                   '/neighbor [lng, lat] <br />' +
+                   '/ready <br />' +
+                   '/top - k, box [min_lng, min_lat, max_lng, max_lat] or point [lng, lat] and r')
+
+
+def venue_id(value):
+    # only integer ids can refer to the stored venues, anything else is an arbitrary point
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
 
 
 class QueryHandler(tornado.web.RequestHandler):
     def get(self):
+        global model_mismatch_warned
         query_points = json.loads(self.get_argument('points'))
         self.add_header('Content-type', 'application/json')
         self.add_header('Access-Control-Allow-Origin', '*')
 
-        # pre-process the points
-        points = []
-        for point in query_points:
-            new_point = {
-                'id': point[0],
-                'lng': point[1],
-                'lat': point[2],
-                'neighbors': connection.get_neighboring_points(point[1], point[2], 200)
-            }
+        # serve the pre-computed scores with a single indexed read, if they came from the loaded model
+        stored = {}
+        if connection.has_scores():
+            if connection.get_scores_model() == model:
+                stored = connection.get_scores(
+                    [venue_id(point[0]) for point in query_points if venue_id(point[0]) is not None])
+            elif not model_mismatch_warned:
+                logger.warning('Stored scores were produced by another model, run `ranknear score` again.')
+                model_mismatch_warned = True
+
+        # a stored score is only used when the point is the stored venue itself
+        scores = []
+        unscored = []
+        for i, point in enumerate(query_points):
+            venue = stored.get(venue_id(point[0]))
+            if venue is not None and abs(venue['lng'] - float(point[1])) <= COORDINATE_TOLERANCE and \
+                    abs(venue['lat'] - float(point[2])) <= COORDINATE_TOLERANCE:
+                scores.append(venue['score'])
+            else:
+                scores.append(None)
+                unscored.append(i)
 
-            points.append(new_point)
+        # fall back to live scoring for the rest
+        if len(unscored) != 0:
+            if not live_scoring:
+                raise tornado.web.HTTPError(503, reason='Live scoring is disabled, no training file was given.')
+            if load_error is not None:
+                raise tornado.web.HTTPError(503, reason='Live scoring is unavailable, failed to load the model.')
+            if not dataset.is_ready or not ranknet.is_ready():
+                raise tornado.web.HTTPError(503, reason='Live scoring is unavailable, the model is not loaded yet.')
+            features = [dataset.vectorize_point(
+                connection.get_neighboring_points(query_points[i][1], query_points[i][2], 200), '生活娱乐')
+                for i in unscored]
+            for i, score in zip(unscored, ranknet.rank(np.asarray(features)).ravel()):
+                scores[i] = float(score)
 
-        ranked_points = ranknet.rank(points)
+        ranked_points = [{
+            'id': point[0],
+            'lng': point[1],
+            'lat': point[2],
+            'score': score
+        } for point, score in zip(query_points, scores)]
+        ranked_points.sort(key=lambda point: point['score'], reverse=True)
 
         self.write(json.dumps(ranked_points))
 
@@ -47,19 +111,14 @@ class HotHandler(tornado.web.RequestHandler):
         self.add_header('Access-Control-Allow-Origin', '*')
 
         result = []
-        cursor = connection.get_connection().cursor()
-        cursor.execute(
-            '''SELECT lng, lat, name, address, checkins, id FROM 'Beijing-Checkins'
-                   WHERE category='生活娱乐' AND checkins > 0 ORDER BY checkins DESC LIMIT 1000''')
-
-        for row in cursor.fetchall():
+        for point in connection.get_hot_points('生活娱乐', 1000):
             result.append({
-                'id': str(row[5]),
-                'lng': str(row[0]),
-                'lat': str(row[1]),
-                'name': str(row[2]),
-                'address': str(row[3]),
-                'checkins': int(row[4])
+                'id': str(point['id']),
+                'lng': str(point['lng']),
+                'lat': str(point['lat']),
+                'name': point['name'],
+                'address': point['address'],
+                'checkins': point['checkins']
             })
         self.write(json.dumps(result))
 
@@ -75,9 +134,81 @@ class NeighborHandler(tornado.web.RequestHandler):
         self.write(json.dumps(neighbors))
 
 
+class TopHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.add_header('Content-type', 'application/json')
+        self.add_header('Access-Control-Allow-Origin', '*')
+
+        if not connection.is_score_index_ready():
+            raise tornado.web.HTTPError(503, reason='The score index is still loading.')
+
+        k = min(int(self.get_argument('k', 10)), MAX_TOP_K)
+        box = self.get_argument('box', None)
+        if box is not None:
+            min_lng, min_lat, max_lng, max_lat = json.loads(box)
+            points = connection.get_top_points(k, min_lng, min_lat, max_lng, max_lat)
+        else:
+            lng, lat = json.loads(self.get_argument('point'))
+            points = connection.get_top_neighboring_points(k, lng, lat, float(self.get_argument('r', 200)))
+
+        connection.expand_infos(points)
+
+        self.write(json.dumps(points))
+
+
+class ReadyHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.add_header('Content-type', 'application/json')
+        self.add_header('Access-Control-Allow-Origin', '*')
+
+        status = {
+            'model': ranknet.is_ready(),
+            'score_index': connection.is_score_index_ready(),
+            'live_scoring': live_scoring and ranknet.is_ready() and dataset.is_ready,
+            'error': None if load_error is None else str(load_error)
+        }
+        if load_error is not None:
+            self.set_status(500)
+        elif not status['model'] or not status['score_index']:
+            self.set_status(503)
+
+        self.write(json.dumps(status))
+
+
+def refresh_score_index():
+    # build the top-k index off the IOLoop, it is only rebuilt when the score table changed
+    tornado.ioloop.IOLoop.current().run_in_executor(None, connection.load_score_index)
+
+
+def load_resources(model, train):
+    # TensorFlow and the training file are slow to load, serve the database-backed endpoints meanwhile
+    global load_error
+    try:
+        ranknet.load(model)
+        if train:
+            dataset.load(train)
+    except Exception as e:
+        logger.exception('Failed to load the model.')
+        load_error = e
+
+
+def make_app():
+    return tornado.web.Application([
+        ('/', WhatsNearHandler),
+        ('/query', QueryHandler),
+        ('/hot', HotHandler),
+        ('/neighbor', NeighborHandler),
+        ('/top', TopHandler),
+        ('/ready', ReadyHandler)
+    ])
+
+
 def main():
     global connection
     global ranknet
+    global dataset
+    global live_scoring
+    global model
 
     # set up argument parser
     import argparse
@@ -94,21 +225,30 @@ def main():
     parser.add_argument('-m', '--model',
                         action='store', dest='model', type=str,
                         help='The trained model to read from.', required=True)
+    parser.add_argument('-t', '--train',
+                        action='store', dest='train', type=str,
+                        help='The training matrix file to read from, enables live scoring.', required=False)
+    parser.add_argument('--store',
+                        action='store_true', dest='store',
+                        help='Keep the venues in a memory-resident columnar store.', required=False)
     results = parser.parse_args()
 
     # start server
-    connection = Database(results.sqlite)
-    ranknet.load(results.model)
+    store = None
+    if results.store:
+        from ranknear.venuestore import VenueStore
+        store = VenueStore(results.sqlite)
+    connection = Database(results.sqlite, store=store)
+    live_scoring = results.train is not None
+    model = model_identity(results.model)
+    threading.Thread(target=load_resources, args=(results.model, results.train), daemon=True).start()
     # start hosting the server
-    app = tornado.web.Application([
-        ('/', WhatsNearHandler),
-        ('/query', QueryHandler),
-        ('/hot', HotHandler),
-        ('/neighbor', NeighborHandler)
-    ])
-
+    app = make_app()
     app.listen(results.port, results.ip)
 
+    refresh_score_index()
+    tornado.ioloop.PeriodicCallback(refresh_score_index, SCORE_INDEX_REFRESH_INTERVAL).start()
+
     tornado.ioloop.IOLoop.current().start()
 
 
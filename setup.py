@@ -27,7 +27,7 @@ setup(
     packages=find_packages(exclude=['tests']),
     install_requires=['numpy', 'pygeohash', 'tensorflow', 'haversine', 'progress'],
     extras_requires={
-        'test': ['pytest-cov', 'pytest', 'coverage'],
+        'test': ['pytest-cov', 'pytest', 'coverage', 'tornado'],
     },
     entry_points={
         'console_scripts': [
@@ -0,0 +1,29 @@
+import sqlite3
+import pygeohash as geohash
+import pytest
+
+VENUES = [
+    (1, 116.3970, 39.9080, 'A', 'Road A', '生活娱乐', 10),
+    (2, 116.3975, 39.9085, 'B', 'Road B', '美食', 5),
+    (3, 116.3980, 39.9090, 'C', 'Road C', '生活娱乐', 0),
+    (4, 116.5000, 40.0000, 'D', 'Road D', '美食', 20),
+    (6, 116.3990, 39.9082, 'E', 'Road E', '购物', 7),
+]
+
+
+def create_database(path, venues=VENUES):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE 'Beijing-Checkins' (id INTEGER PRIMARY KEY, lng REAL, lat REAL, name TEXT,
+                    address TEXT, category TEXT, checkins INTEGER, geohash TEXT)''')
+    conn.executemany('''INSERT INTO 'Beijing-Checkins' VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     [venue + (geohash.encode(venue[2], venue[1]), ) for venue in venues])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def database_path(request, tmp_path):
+    """ Path of a 'Beijing-Checkins' database filled with VENUES, or the venues given by indirect parametrization. """
+    path = str(tmp_path / 'checkins.db')
+    create_database(path, getattr(request, 'param', VENUES))
+    return path
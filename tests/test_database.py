@@ -0,0 +1,74 @@
+import json
+from ranknear.database import Database
+from ranknear.dataset import Dataset
+
+
+def test_scores(database_path):
+    database = Database(database_path)
+    assert not database.has_scores()
+
+    assert database.get_scores_model() is None
+
+    database.store_scores([1, 2, 3, 4], [[1, 0.5], [2, 0.1], [3, 0.2], [1, 0.3]], [0.3, 0.9, 0.1, 0.5], 'model')
+    assert database.has_scores()
+    assert database.get_scores_model() == 'model'
+    assert database.get_scores([2, 4, 5]) == {
+        2: {'id': 2, 'lng': 116.3975, 'lat': 39.9085, 'score': 0.9},
+        4: {'id': 4, 'lng': 116.5000, 'lat': 40.0000, 'score': 0.5}
+    }
+
+
+def test_top_points(database_path):
+    database = Database(database_path)
+    database.store_scores([1, 2, 3, 4], [[1], [2], [3], [4]], [0.3, 0.9, 0.1, 0.5])
+
+    assert [point['id'] for point in database.get_top_points(2, 116.39, 39.90, 116.40, 39.91)] == [2, 1]
+    assert [point['id'] for point in database.get_top_points(5, 116.0, 39.0, 117.0, 41.0)] == [2, 4, 1, 3]
+    assert [point['id'] for point in database.get_top_neighboring_points(5, 116.3975, 39.9085, 200)] == [2, 1, 3]
+
+
+def test_vectorize_database(database_path, tmp_path):
+    database = Database(database_path)
+
+    categories = database.get_categories()
+    ones = {p: {l: 1.5 for l in categories} for p in categories}
+    train = tmp_path / 'train.json'
+    train.write_text('\n'.join(json.dumps(line) for line in (ones, ones, categories, [], [])))
+    dataset = Dataset()
+    dataset.load(str(train))
+
+    ids, features = dataset.vectorize_database(database)
+    assert sorted(ids) == [1, 2, 3, 4, 6]
+    for venue_id, feature in zip(ids, features):
+        row = database.get_connection().execute('''SELECT lng, lat FROM 'Beijing-Checkins' WHERE id=?''',
+                                                (venue_id, )).fetchone()
+        assert feature == dataset.vectorize_point(database.get_neighboring_points(row[0], row[1], 200), '生活娱乐')
+
+
+def test_store_scores_replaces(database_path):
+    database = Database(database_path)
+    database.store_scores([1, 2], [[1], [2]], [0.3, 0.9], 'model')
+    database.store_scores([3, 4], [[3], [4]], [0.1, 0.5])
+    assert sorted(database.get_scores([1, 2, 3, 4]).keys()) == [3, 4]
+    assert database.get_scores_model() is None
+    assert database.get_connection().execute('''SELECT COUNT(*) FROM sqlite_master
+                                                 WHERE name='Beijing-Scores-New' ''').fetchone()[0] == 0
+
+
+def test_score_index_refresh(database_path):
+    server = Database(database_path)
+    assert not server.is_score_index_ready()
+    assert server.load_score_index()
+    assert server.get_top_points(5, 116.0, 39.0, 117.0, 41.0) == []
+
+    # rescoring from another process invalidates the index
+    Database(database_path).store_scores([1, 2, 3, 4], [[1], [2], [3], [4]], [0.3, 0.9, 0.1, 0.5])
+    assert server.load_score_index()
+    assert not server.load_score_index()
+    assert [point['id'] for point in server.get_top_points(2, 116.0, 39.0, 117.0, 41.0)] == [2, 4]
+
+
+def test_expand_infos(database_path):
+    database = Database(database_path)
+    points = database.expand_infos([{'id': 3}, {'id': 1}])
+    assert points == [database.expand_info({'id': 3}), database.expand_info({'id': 1})]
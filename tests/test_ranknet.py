@@ -1,5 +1,5 @@
 from ranknear.dataset import Dataset
-from ranknear.ranknet import RankNet
+from ranknear.ranknet import RankNet, model_identity
 import numpy as np
 
 
@@ -9,3 +9,26 @@ def test_ranknet():
     ranknet = RankNet()
     ndcg = ranknet.train(np.array(dataset.get_features()), np.array(dataset.get_labels()), 0.8)
     assert ndcg > 0.3
+
+
+def test_load_and_rank(tmp_path):
+    np.random.seed(0)
+    features = np.random.rand(200, 5)
+    labels = (features.sum(axis=1, keepdims=True) * 10).astype(int)
+    ranknet = RankNet()
+    ranknet.train(features, labels, epochs=1)
+    path = str(tmp_path / 'model.h5')
+    ranknet.save(path)
+
+    loaded = RankNet()
+    assert loaded.rank(features[:5]) is None
+    loaded.load(path)
+    assert loaded.rank(features[:5]).shape == (5, 1)
+    assert np.allclose(loaded.rank(features[:5]), ranknet.rank(features[:5]))
+
+
+def test_model_identity(tmp_path):
+    import hashlib
+    path = tmp_path / 'model.h5'
+    path.write_bytes(b'model')
+    assert model_identity(str(path)) == hashlib.sha1(b'model').hexdigest()
@@ -0,0 +1,18 @@
+import random
+from ranknear.scoreindex import ScoreIndex
+
+
+def test_top():
+    random.seed(0)
+    points = [(random.random(), i, 116 + random.random(), 39.5 + random.random()) for i in range(5000)]
+    index = ScoreIndex(points)
+
+    for box in [(116.2, 39.7, 116.3, 39.8), (116.0, 39.5, 117.0, 40.5), (116.55, 39.9, 116.56, 39.95)]:
+        inside = [point for point in points
+                  if box[0] <= point[2] <= box[2] and box[1] <= point[3] <= box[3]]
+        for k in (0, 1, 10, 100):
+            assert index.top(k, *box) == sorted(inside, reverse=True)[:k]
+
+    predicate = lambda point: point[1] % 2 == 0
+    even = [point for point in points if predicate(point)]
+    assert index.top(10, 116.0, 39.5, 117.0, 40.5, predicate) == sorted(even, reverse=True)[:10]
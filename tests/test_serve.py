@@ -0,0 +1,100 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+tornado = pytest.importorskip('tornado')
+from tornado.escape import url_escape
+from tornado.testing import AsyncHTTPTestCase
+from ranknear.database import Database
+from ranknear.dataset import Dataset
+from ranknear.ranknet import RankNet
+from tests.conftest import create_database
+
+spec = importlib.util.spec_from_file_location(
+    'serve', os.path.join(os.path.dirname(__file__), os.pardir, 'scripts', 'serve.py'))
+serve = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(serve)
+
+
+class ServeTest(AsyncHTTPTestCase):
+    def setUp(self):
+        super(ServeTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'checkins.db')
+        create_database(self.path)
+        serve.connection = Database(self.path)
+        serve.ranknet = RankNet()
+        serve.dataset = Dataset()
+        serve.live_scoring = False
+        serve.load_error = None
+        serve.model = None
+
+    def tearDown(self):
+        serve.connection.get_connection().close()
+        shutil.rmtree(self.tmp_dir)
+        super(ServeTest, self).tearDown()
+
+    def get_app(self):
+        return serve.make_app()
+
+    def get_json(self, path):
+        response = self.fetch(path)
+        return response.code, json.loads(response.body)
+
+    def test_ready(self):
+        assert self.get_json('/ready') == (
+            503, {'model': False, 'score_index': False, 'live_scoring': False, 'error': None})
+
+        serve.load_resources(os.path.join(self.tmp_dir, 'missing.h5'), None)
+        code, status = self.get_json('/ready')
+        assert code == 500 and not status['model'] and status['error'] is not None
+
+    def test_ready_after_load(self):
+        pytest.importorskip('tensorflow')
+        features = np.random.rand(100, 5)
+        ranknet = RankNet()
+        ranknet.train(features, features[:, :1] * 10, epochs=1)
+        model = os.path.join(self.tmp_dir, 'model.h5')
+        ranknet.save(model)
+
+        serve.load_resources(model, None)
+        assert self.get_json('/ready') == (
+            503, {'model': True, 'score_index': False, 'live_scoring': False, 'error': None})
+        serve.connection.load_score_index()
+        assert self.get_json('/ready') == (
+            200, {'model': True, 'score_index': True, 'live_scoring': False, 'error': None})
+
+    def query(self, points):
+        return self.fetch('/query?points=' + url_escape(json.dumps(points)))
+
+    def test_query(self):
+        serve.model = 'model'
+        serve.connection.store_scores([1, 2, 3], [[1], [2], [3]], [0.3, 0.9, 0.1], 'model')
+        points = [[1, 116.3970, 39.9080], ['2', 116.3975, 39.9085]]
+        response = self.query(points)
+        assert response.code == 200
+        assert [(point['id'], point['score']) for point in json.loads(response.body)] == [('2', 0.9), (1, 0.3)]
+
+        # arbitrary ids and points away from the stored venue need live scoring
+        for point in (['x', 116.3970, 39.9080], [1, 116.4000, 39.9080], [4, 116.5000, 40.0000]):
+            response = self.query(points + [point])
+            assert response.code == 503 and 'no training file' in response.reason
+
+        serve.live_scoring = True
+        response = self.query(points + [[4, 116.5000, 40.0000]])
+        assert response.code == 503 and 'not loaded yet' in response.reason
+
+        # scores of another model are not served
+        serve.model = 'other'
+        assert self.query(points).code == 503
+
+    def test_top(self):
+        assert self.fetch('/top?box=' + url_escape('[116.0, 39.0, 117.0, 41.0]')).code == 503
+
+        serve.connection.store_scores([1, 2, 3, 4], [[1], [2], [3], [4]], [0.3, 0.9, 0.1, 0.5])
+        serve.connection.load_score_index()
+        code, points = self.get_json('/top?k=2&box=' + url_escape('[116.0, 39.0, 117.0, 41.0]'))
+        assert code == 200 and [(point['id'], point['name']) for point in points] == [(2, 'B'), (4, 'D')]
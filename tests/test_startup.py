@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import pytest
+
+# budgets for the import time on top of the interpreter startup, in microseconds
+IMPORT_TIME_BUDGET = 50000
+SERVE_IMPORT_TIME_BUDGET = 1000000
+
+SERVE_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'scripts', 'serve.py')
+
+
+def import_times(statement):
+    """ Run the statement under -X importtime, returns the cumulative time of every imported module. """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented, only top level imports add up to the total
+        times[name.strip()] = (int(cumulative), len(name) - len(name.lstrip()) == 1)
+    return times
+
+
+def total_import_time(statement):
+    """ Import time of the statement, without the modules the interpreter imports at startup. """
+    baseline = import_times('pass')
+    return sum(cumulative for name, (cumulative, top_level) in import_times(statement).items()
+               if top_level and name not in baseline)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime and lazy imports require Python 3.7')
+def test_import_time():
+    times = import_times('import ranknear')
+    assert times['ranknear'][0] < IMPORT_TIME_BUDGET
+    for heavy in ('numpy', 'tensorflow', 'pygeohash', 'haversine', 'ranknear.database'):
+        assert heavy not in times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime and lazy imports require Python 3.7')
+def test_cli_import_time():
+    statement = 'import ranknear.__main__'
+    assert total_import_time(statement) < IMPORT_TIME_BUDGET
+    for heavy in ('numpy', 'tensorflow'):
+        assert heavy not in import_times(statement)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime and lazy imports require Python 3.7')
+def test_serve_import_time():
+    pytest.importorskip('tornado')
+    # load the server module without running main
+    statement = ('import importlib.util; spec = importlib.util.spec_from_file_location("serve", {!r}); '
+                 'spec.loader.exec_module(importlib.util.module_from_spec(spec))').format(SERVE_PATH)
+    assert total_import_time(statement) < SERVE_IMPORT_TIME_BUDGET
+    assert 'tensorflow' not in import_times(statement)
+
+
+def test_lazy_attributes():
+    import ranknear
+    from ranknear.database import Database
+    assert ranknear.Database is Database
+    assert 'RankNet' in dir(ranknear)
@@ -0,0 +1,132 @@
+import json
+import numpy as np
+import pytest
+from ranknear.database import Database
+from ranknear.dataset import Dataset
+from ranknear.venuestore import VenueStore
+
+
+def test_drop_in(database_path):
+    store = VenueStore(database_path)
+    database = Database(database_path)
+    stored = Database(database_path, store=store)
+
+    assert len(store) == 5
+    assert stored.get_total_num() == database.get_total_num()
+    assert stored.get_categories() == database.get_categories()
+    assert store.index_of([2, 6, 5]).tolist() == [1, 4, -1]
+
+    by_id = lambda point: point['id']
+    assert sorted(stored.get_neighboring_points(116.3975, 39.9085, 200), key=by_id) == \
+        sorted(database.get_neighboring_points(116.3975, 39.9085, 200), key=by_id)
+    assert stored.expand_info({'id': 3}) == database.expand_info({'id': 3})
+    assert stored.get_hot_points('生活娱乐', 10) == database.get_hot_points('生活娱乐', 10)
+
+    point = {'id': 1, 'neighbors': [{'id': 2}, {'id': 6}]}
+    assert stored.expand_neighbors(dict(point, neighbors=[{'id': 2}, {'id': 6}])) == \
+        database.expand_neighbors(point)
+
+
+def test_unknown_ids(database_path):
+    stored = Database(database_path, store=VenueStore(database_path))
+    with pytest.raises(KeyError):
+        stored.expand_info({'id': 12345})
+    point = {'id': 1, 'neighbors': [{'id': 2}, {'id': 12345}]}
+    with pytest.raises(KeyError):
+        stored.expand_neighbors(point)
+    assert point['neighbors'] == [{'id': 2}, {'id': 12345}]
+
+
+@pytest.mark.parametrize('database_path', [[
+    (1, 116.3970, 39.9080, 'A', 'Road A', '生活娱乐', 10),
+    (2, 116.3975, 39.9085, '', '', '美食', 5),
+]], indirect=True)
+def test_text_pool(database_path):
+    store = VenueStore(database_path)
+    assert [store.get_name(0), store.get_address(0), store.get_name(1), store.get_address(1)] == \
+        ['A', 'Road A', '', '']
+
+
+def test_vectorize_indices(database_path, tmp_path):
+    store = VenueStore(database_path)
+    database = Database(database_path)
+
+    # global parameters with a category that is missing from the store
+    categories = dict(database.get_categories(), **{'教育': 3})
+    coefficient = {p: {l: 0.5 + 0.1 * i + 0.05 * j for j, l in enumerate(categories)}
+                   for i, p in enumerate(categories)}
+    mean = {p: {l: 0.2 * i + 0.1 * j for j, l in enumerate(categories)} for i, p in enumerate(categories)}
+    train = tmp_path / 'train.json'
+    train.write_text('\n'.join(json.dumps(line) for line in (mean, coefficient, categories, [], [])))
+    dataset = Dataset()
+    dataset.load(str(train))
+
+    def check():
+        for lng, lat in [(116.3975, 39.9085), (116.5000, 40.0000), (116.0, 39.0)]:
+            neighbors = database.get_neighboring_points(lng, lat, 200)
+            # vectorize_point only knows the dataset categories
+            expected = dataset.vectorize_point(neighbors, '生活娱乐')
+            actual = dataset.vectorize_indices(store, store.get_neighbors(lng, lat, 200), '生活娱乐')
+            assert actual[0] == expected[0] and actual[4] == expected[4]
+            for a, b in zip(actual[1:4], expected[1:4]):
+                assert abs(a - b) < 1e-9
+
+    check()
+
+    # reloading the coefficients drops the cached jensen weights
+    coefficient = {p: {l: 2.0 for l in categories} for p in categories}
+    train.write_text('\n'.join(json.dumps(line) for line in (mean, coefficient, categories, [], [])))
+    dataset.load(str(train))
+    check()
+
+    ids, features = dataset.vectorize_database(Database(database_path, store=store))
+    assert sorted(ids) == [1, 2, 3, 4, 6]
+    for venue_id, feature in zip(ids, features):
+        index = store.get_index(venue_id)
+        expected = dataset.vectorize_indices(store, store.get_neighbors(store.lngs[index], store.lats[index], 200),
+                                             '生活娱乐')
+        assert feature == pytest.approx(expected)
+
+
+def random_venues(num):
+    import random
+    generator = random.Random(0)
+    return [(i, 116.395 + generator.random() * 0.01, 39.905 + generator.random() * 0.01, 'V%d' % i, 'Road %d' % i,
+             generator.choice(['生活娱乐', '美食', '购物', '教育']), generator.randint(0, 50)) for i in range(1, num + 1)]
+
+
+@pytest.mark.parametrize('database_path', [random_venues(300)], indirect=True)
+def test_iter_neighbor_counts(database_path):
+    store = VenueStore(database_path)
+    seen = []
+    for rows, counts, checkins in store.iter_neighbor_counts(200, block=16):
+        for index, count, checkin in zip(rows.tolist(), counts.tolist(), checkins.tolist()):
+            neighbors = store.get_neighbors(store.lngs[index], store.lats[index], 200, geo=store.geohashes[index])
+            assert count == np.bincount(store.categories[neighbors], minlength=len(count)).tolist()
+            assert checkin == store.checkins[neighbors].sum()
+            seen.append(index)
+    assert sorted(seen) == list(range(len(store)))
+
+
+@pytest.mark.parametrize('database_path', [random_venues(300)], indirect=True)
+def test_prepare_store(database_path, tmp_path):
+    def prepare(database):
+        dataset = Dataset()
+        dataset.prepare(database)
+        path = str(tmp_path / 'train.json')
+        dataset.save(path)
+        with open(path) as f:
+            mean, coefficient = json.loads(f.readline()), json.loads(f.readline())
+        samples = {venue_id: (label, feature) for venue_id, label, feature in
+                   zip(dataset.get_ids(), dataset.get_labels(), dataset.get_features())}
+        return mean, coefficient, samples
+
+    expected = prepare(database_path)
+    actual = prepare(Database(database_path, store=VenueStore(database_path)))
+    for actual_matrix, expected_matrix in zip(actual[:2], expected[:2]):
+        for p in expected_matrix:
+            assert actual_matrix[p] == pytest.approx(expected_matrix[p])
+    assert actual[2].keys() == expected[2].keys()
+    for venue_id, (label, feature) in expected[2].items():
+        assert actual[2][venue_id][0] == label
+        assert actual[2][venue_id][1] == pytest.approx(feature)